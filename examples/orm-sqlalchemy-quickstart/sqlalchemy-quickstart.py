@@ -1,7 +1,8 @@
+import argparse
 import os
 import dotenv
 
-from sqlalchemy import Column, Integer, create_engine, Text, URL
+from sqlalchemy import Column, Integer, create_engine, insert, select, Text, URL
 from sqlalchemy.orm import declarative_base, Session
 from mo_vector.sqlalchemy import VectorType, VectorAdaptor
 
@@ -42,76 +43,101 @@ class DocumentWithIndex(Base):
     embedding = Column(VectorType(3))
 
 
-Base.metadata.drop_all(engine)
-Base.metadata.create_all(engine)
-
-
 def test_document():
+    # Brute-force baseline: `Document` has no vector index, so every search below
+    # computes the distance for all rows. Run with `--brute-force` to use it.
+
     # Step 3: Insert embeddings into the table.
+    # Insert all rows with a single executemany instead of one INSERT per row.
     with Session(engine) as session:
-        session.add(Document(content="dog", embedding=[1, 2, 1]))
-        session.add(Document(content="fish", embedding=[1, 2, 4]))
-        session.add(Document(content="tree", embedding=[1, 0, 0]))
+        session.execute(insert(Document), [
+            {"content": "dog", "embedding": [1, 2, 1]},
+            {"content": "fish", "embedding": [1, 2, 4]},
+            {"content": "tree", "embedding": [1, 0, 0]},
+        ])
         session.commit()
 
     # Step 4: Get the 3-nearest neighbor documents.
     print('Get 3-nearest neighbor documents:')
     with Session(engine) as session:
-        distance = Document.embedding.cosine_distance([1, 2, 3]).label('distance')
-        results = session.query(Document, distance).order_by(distance).limit(3).all()
+        distance = Document.embedding.l2_distance([1, 2, 3]).label('distance')
+        results = session.execute(
+            select(Document.content, distance).order_by(distance).limit(3)
+        ).all()
 
-        for doc, distance in results:
+        for content, distance in results:
             print(f'  - distance: {distance}\n'
-                  f'    document: {doc.content}')
+                  f'    document: {content}')
 
     # Step 5: Get documents within a certain distance.
     print('Get documents within a certain distance:')
     with Session(engine) as session:
-        distance = Document.embedding.cosine_distance([1, 2, 3]).label('distance')
-        results = session.query(
-            Document, distance
-        ).filter(distance < 0.2).order_by(distance).limit(3).all()
+        distance = Document.embedding.l2_distance([1, 2, 3]).label('distance')
+        results = session.execute(
+            select(Document.content, distance).filter(distance < 2.5).order_by(distance).limit(3)
+        ).all()
 
-        for doc, distance in results:
+        for content, distance in results:
             print(f'  - distance: {distance}\n'
-                  f'    document: {doc.content}')
+                  f'    document: {content}')
 
 
 def test_document_with_index():
+    # The index is built with `vector_l2_ops`, so the searches below must use `l2_distance` to use it.
+    # Tune the index through `algorithm`, `lists` (ivfflat) or `m`, `ef_construction`, `ef_search` (hnsw).
     VectorAdaptor(engine).create_vector_index(
         DocumentWithIndex.embedding,
         skip_existing=True,
+        algorithm="ivfflat",
+        lists=1000,
     )
 
     # Step 3: Insert embeddings into the table.
+    # Insert all rows with a single executemany instead of one INSERT per row.
     with Session(engine) as session:
-        session.add(DocumentWithIndex(content="dog", embedding=[1, 2, 1]))
-        session.add(DocumentWithIndex(content="fish", embedding=[1, 2, 4]))
-        session.add(DocumentWithIndex(content="tree", embedding=[1, 0, 0]))
+        session.execute(insert(DocumentWithIndex), [
+            {"content": "dog", "embedding": [1, 2, 1]},
+            {"content": "fish", "embedding": [1, 2, 4]},
+            {"content": "tree", "embedding": [1, 0, 0]},
+        ])
         session.commit()
 
     # Step 4: Get the 3-nearest neighbor documents.
     print('Get 3-nearest neighbor documents:')
     with Session(engine) as session:
-        distance = DocumentWithIndex.embedding.cosine_distance([1, 2, 3]).label('distance')
-        results = session.query(DocumentWithIndex, distance).order_by(distance).limit(3).all()
+        distance = DocumentWithIndex.embedding.l2_distance([1, 2, 3]).label('distance')
+        results = session.execute(
+            select(DocumentWithIndex.content, distance).order_by(distance).limit(3)
+        ).all()
 
-        for doc, distance in results:
+        for content, distance in results:
             print(f'  - distance: {distance}\n'
-                  f'    document: {doc.content}')
+                  f'    document: {content}')
 
     # Step 5: Get documents within a certain distance.
     print('Get documents within a certain distance:')
     with Session(engine) as session:
-        distance = DocumentWithIndex.embedding.cosine_distance([1, 2, 3]).label('distance')
-        results = session.query(
-            DocumentWithIndex, distance
-        ).filter(distance < 0.2).order_by(distance).limit(3).all()
+        distance = DocumentWithIndex.embedding.l2_distance([1, 2, 3]).label('distance')
+        results = session.execute(
+            select(DocumentWithIndex.content, distance).filter(distance < 2.5).order_by(distance).limit(3)
+        ).all()
 
-        for doc, distance in results:
+        for content, distance in results:
             print(f'  - distance: {distance}\n'
-                  f'    document: {doc.content}')
+                  f'    document: {content}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reset', action='store_true', help='drop the demo tables before running')
+    parser.add_argument('--brute-force', action='store_true', help='search the table without a vector index')
+    args = parser.parse_args()
 
+    if args.reset:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
 
-test_document()
-test_document_with_index()
\ No newline at end of file
+    if args.brute_force:
+        test_document()
+    else:
+        test_document_with_index()
@@ -1,6 +1,6 @@
 import os
 
-from mo_vector.client import MoVectorClient
+from mo_vector.client import MoVectorClient, get_or_compute
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
@@ -8,13 +8,14 @@ from dotenv import load_dotenv
 print("Downloading and loading the embedding model...")
 os.environ['HTTP_PROXY'] = 'http://127.0.0.1:1089'
 os.environ['HTTPS_PROXY'] = 'http://127.0.0.1:1089'
-embed_model = SentenceTransformer("sentence-transformers/msmarco-MiniLM-L12-cos-v5", trust_remote_code=True)
+embed_model_name = "sentence-transformers/msmarco-MiniLM-L12-cos-v5"
+embed_model = SentenceTransformer(embed_model_name, trust_remote_code=True)
 embed_model_dims = embed_model.get_sentence_embedding_dimension()
 
 
 def text_to_embedding(text):
-    """Generates vector embeddings for the given text."""
-    embedding = embed_model.encode(text)
+    """Generates vector embeddings for the given text, reusing the cached one if the text was embedded before."""
+    embedding = get_or_compute(text, embed_model.encode, embed_model_name)
     return embedding.tolist()
 
 
@@ -1,4 +1,5 @@
 from mo_vector.client.vector_client import MoVectorClient
+from mo_vector.client.embed_cache import EmbeddingCache, get_or_compute
 from mo_vector.client.utils import (
     EmbeddingColumnMismatchError,
     check_table_existence,
@@ -10,4 +11,6 @@ __all__ = [
     "EmbeddingColumnMismatchError",
     "check_table_existence",
     "get_embedding_column_definition",
+    "EmbeddingCache",
+    "get_or_compute",
 ]
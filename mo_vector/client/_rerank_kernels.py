@@ -0,0 +1,9 @@
+import numba
+
+
+# 安装了 numba 时, 较长的结果列表使用编译后的循环累加 RRF 得分, 避免创建中间数组
+@numba.njit(cache=True)
+def rrf_accumulate(scores, ids, rank_value):
+    for i in range(ids.size):
+        scores[ids[i]] += 1.0 / (rank_value + i + 1)
+
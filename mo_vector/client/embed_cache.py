@@ -0,0 +1,109 @@
+import collections
+import hashlib
+import threading
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+
+def embedding_cache_key(content: str, model: str) -> str:
+    """
+    Builds the cache key of an embedding from the content hash and the model name.
+
+    Args:
+        content (str): The text to be embedded.
+        model (str): The name of the embedding model.
+
+    Returns:
+        str: The cache key.
+    """
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest() + ":" + model
+
+
+class EmbeddingCache:
+    """
+    An in-process LRU cache of embeddings, so that unchanged texts are not embedded again on re-index.
+
+    Cached embeddings are read-only numpy arrays, copy them before modifying.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        """
+        Args:
+            maxsize (int): The maximum number of embeddings to keep, defaults to 4096.
+        """
+        if maxsize <= 0:
+            raise ValueError("expected maxsize to be a positive integer")
+
+        self._maxsize = maxsize
+        self._embeddings = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._embeddings)
+
+    def get_or_compute(
+        self,
+        content: str,
+        provider: Callable[[str], Any],
+        model: str,
+    ) -> np.ndarray:
+        """
+        Returns the cached embedding of the content, or computes and caches it with the provider.
+
+        Args:
+            content (str): The text to be embedded.
+            provider (Callable[[str], Any]): The function computing the embedding of a text.
+            model (str): The name of the embedding model, embeddings of different models are cached separately.
+
+        Returns:
+            np.ndarray: The embedding of the content.
+        """
+        key = embedding_cache_key(content, model)
+        with self._lock:
+            embedding = self._embeddings.get(key)
+            if embedding is not None:
+                self._embeddings.move_to_end(key)
+                return embedding
+
+        # Compute outside the lock, the provider is usually a slow model or remote call.
+        embedding = np.array(provider(content))
+        embedding.setflags(write=False)
+
+        with self._lock:
+            self._embeddings[key] = embedding
+            self._embeddings.move_to_end(key)
+            if len(self._embeddings) > self._maxsize:
+                self._embeddings.popitem(last=False)
+        return embedding
+
+    def clear(self) -> None:
+        """Removes all cached embeddings."""
+        with self._lock:
+            self._embeddings.clear()
+
+
+_default_cache = EmbeddingCache()
+
+
+def get_or_compute(
+    content: str,
+    provider: Callable[[str], Any],
+    model: str,
+    cache: Optional[EmbeddingCache] = None,
+) -> np.ndarray:
+    """
+    Returns the embedding of the content, computing it with the provider only if it is not cached yet.
+
+    Args:
+        content (str): The text to be embedded.
+        provider (Callable[[str], Any]): The function computing the embedding of a text.
+        model (str): The name of the embedding model.
+        cache (Optional[EmbeddingCache]): The cache to use, defaults to a process-wide cache.
+
+    Returns:
+        np.ndarray: The embedding of the content.
+    """
+    if cache is None:
+        cache = _default_cache
+    return cache.get_or_compute(content, provider, model)
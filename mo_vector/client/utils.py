@@ -1,7 +1,23 @@
+import contextlib
+import functools
 import math
+import operator
 import sqlalchemy
 import re
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Generator, Optional
+
+import numpy as np
+
+_DIMENSION_RE = re.compile(r"VECTOR(?:\((\d+)\))?", re.IGNORECASE)
+_DISTANCE_RE = re.compile(r"distance=([^,\)]+)")
+
+_INV_PI = 1.0 / math.pi
+
+# 结果列表不短于该长度时才使用 numba 编译的 RRF 累加循环, 更短时首次调用的 JIT 编译开销无法摊回
+_NUMBA_MIN_SIZE = 4096
+
+# 两路结果的总长度小于该值时直接在 dict 上累加得分, 此时创建 NumPy 数组的固定开销大于向量化的收益
+_SMALL_RERANK_SIZE = 128
 
 
 class EmbeddingColumnMismatchError(ValueError):
@@ -21,10 +37,39 @@ class EmbeddingColumnMismatchError(ValueError):
         )
 
 
+@contextlib.contextmanager
+def _engine_scope(
+    connection_string: str,
+    engine_args: Optional[Dict[str, Any]] = None,
+    engine: Optional[sqlalchemy.engine.Engine] = None,
+) -> Generator[sqlalchemy.engine.Engine, None, None]:
+    """
+    Yields the given engine as is, or a temporary engine for the connection string which is disposed on exit.
+
+    Args:
+        connection_string (str): The connection string for the database.
+        engine_args (Optional[Dict[str, Any]]): Additional arguments for the temporary engine.
+        engine (Optional[sqlalchemy.engine.Engine]): An existing engine to reuse, e.g. the one of the client.
+
+    Returns:
+        sqlalchemy.engine.Engine: The engine to use.
+    """
+    if engine is not None:
+        yield engine
+        return
+
+    engine = sqlalchemy.create_engine(connection_string, **(engine_args or {}))
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
 def check_table_existence(
     connection_string: str,
     table_name: str,
     engine_args: Optional[Dict[str, Any]] = None,
+    engine: Optional[sqlalchemy.engine.Engine] = None,
 ) -> bool:
     """
     Check if the vector table exists in the database
@@ -33,16 +78,15 @@ def check_table_existence(
         connection_string (str): The connection string for the database.
         table_name (str): The name of the table to check.
         engine_args (Optional[Dict[str, Any]]): Additional arguments for the engine.
+        engine (Optional[sqlalchemy.engine.Engine]): An existing engine to reuse instead of creating one,
+            defaults to None.
 
     Returns:
         bool: True if the table exists, False otherwise.
     """
-    engine = sqlalchemy.create_engine(connection_string, **(engine_args or {}))
-    try:
+    with _engine_scope(connection_string, engine_args, engine) as engine:
         inspector = sqlalchemy.inspect(engine)
-        return table_name in inspector.get_table_names()
-    finally:
-        engine.dispose()
+        return inspector.has_table(table_name)
 
 
 def get_embedding_column_definition(
@@ -50,6 +94,7 @@ def get_embedding_column_definition(
     table_name: str,
     column_name: str,
     engine_args: Optional[Dict[str, Any]] = None,
+    engine: Optional[sqlalchemy.engine.Engine] = None,
 ):
     """
     Retrieves the column definition of an embedding column from a database table.
@@ -59,21 +104,32 @@ def get_embedding_column_definition(
         table_name (str): The name of the table.
         column_name (str): The name of the column.
         engine_args (Optional[Dict[str, Any]]): Additional arguments for the engine.
+        engine (Optional[sqlalchemy.engine.Engine]): An existing engine to reuse instead of creating one,
+            defaults to None.
 
     Returns:
         tuple: A tuple containing the dimension (int or None) and distance metric (str or None).
     """
-    engine = sqlalchemy.create_engine(connection_string, **(engine_args or {}))
-    try:
-        with engine.connect() as connection:
-            query = f"""SELECT COLUMN_TYPE, COLUMN_COMMENT
-                        FROM INFORMATION_SCHEMA.COLUMNS
-                        WHERE TABLE_NAME = '{table_name}' AND COLUMN_NAME = '{column_name}'"""
-            result = connection.execute(sqlalchemy.text(query)).fetchone()
-            if result:
-                return extract_info_from_column_definition(result[0], result[1])
-    finally:
-        engine.dispose()
+    # Use the DBAPI connection directly, this tiny lookup doesn't need the result processing of SQLAlchemy.
+    with _engine_scope(connection_string, engine_args, engine) as engine:
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(
+                    """SELECT COLUMN_TYPE, COLUMN_COMMENT
+                       FROM INFORMATION_SCHEMA.COLUMNS
+                       WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+                    (table_name, column_name),
+                )
+                result = cursor.fetchone()
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+
+    if result:
+        return extract_info_from_column_definition(result[0], result[1])
 
     return None, None
 
@@ -90,7 +146,7 @@ def extract_info_from_column_definition(column_type, column_comment):
         tuple: A tuple containing the dimension (int or None) and the distance metric (str or None).
     """
     # Try to extract the dimension, which is optional.
-    dimension_match = re.search(r"VECTOR(?:\((\d+)\))?", column_type, re.IGNORECASE)
+    dimension_match = _DIMENSION_RE.search(column_type)
     dimension = (
         int(dimension_match.group(1))
         if dimension_match and dimension_match.group(1)
@@ -98,15 +154,15 @@ def extract_info_from_column_definition(column_type, column_comment):
     )
 
     # Extracting index type and distance metric from the comment, supporting both single and double quotes.
-    distance_match = re.search(r"distance=([^,\)]+)", column_comment)
+    distance_match = _DISTANCE_RE.search(column_comment)
     distance = distance_match.group(1) if distance_match else None
 
     return dimension, distance
 
 
 def rerank_data(
-    vector_data: list[int, str],
-    full_text_data: list[int, str],
+    vector_data: list[str],
+    full_text_data: list[str],
     k: int,
     rerank_option: dict[str, any]
 ):
@@ -120,90 +176,275 @@ def rerank_data(
     elif rerank_type == 'WeightedRank':
         return weighted_rank(vector_data, full_text_data, k, weighted_score)
     else:
-        return list(set(vector_data + full_text_data))
+        # 按首次出现的顺序去重
+        return list(dict.fromkeys([*vector_data, *full_text_data]))[:k]
+
+
+def rerank_data_batch(
+    vector_batches: list[list[str]],
+    full_text_batches: list[list[str]],
+    k: int,
+    rerank_option: dict[str, any]
+):
+    """
+    对多个查询的检索结果批量重排序, 所有查询的得分在一个 (查询数, 文档数) 的矩阵上一次性计算。
+
+    :param vector_batches: 每个查询的向量检索结果, 按排名排列的文档列表
+    :param full_text_batches: 每个查询的全文检索结果, 与 vector_batches 一一对应
+    :param k: 每个查询返回前 k 个文档
+    :param rerank_option: 与 rerank_data 相同
+    :return: 每个查询的 rerank_data 结果
+    """
+    if len(vector_batches) != len(full_text_batches):
+        raise ValueError(
+            f"expected the same number of vector and full text batches, "
+            f"but got {len(vector_batches)} and {len(full_text_batches)}"
+        )
+
+    rerank_type = rerank_option["rerank_type"]
+    rank_value = rerank_option.get("rank_value", 0)
+    weighted_score = rerank_option.get("weighted_score", [])
+
+    interned = [
+        _intern_texts(vector_data, full_text_data)
+        for vector_data, full_text_data in zip(vector_batches, full_text_batches)
+    ]
+    if rerank_type == 'RRF':
+        rank_scores = [functools.partial(_rrf_rank_scores, rank_value=rank_value)] * 2
+    elif rerank_type == 'WeightedRank':
+        rank_scores = [
+            functools.partial(_weighted_rank_scores, weight=weighted_score[0]),
+            functools.partial(_weighted_rank_scores, weight=weighted_score[1]),
+        ]
+    else:
+        return [texts[:k] for texts, _ in interned]
+
+    n_queries = len(interned)
+    doc_counts = np.array([len(texts) for texts, _ in interned], dtype=np.int64)
+    n_docs = int(doc_counts.max(initial=0))
+    # 多出的最后一列用于接收填充位置的得分
+    scores = np.zeros((n_queries, n_docs + 1), dtype=np.float64)
+    query_index = np.arange(n_queries)[:, np.newaxis]
+    for source, source_rank_scores in enumerate(rank_scores):
+        max_len = max((id_arrays[source].size for _, id_arrays in interned), default=0)
+        ids = np.full((n_queries, max_len), n_docs, dtype=np.int64)
+        for query, (_, id_arrays) in enumerate(interned):
+            ids[query, :id_arrays[source].size] = id_arrays[source]
+        np.add.at(scores, (query_index, ids), source_rank_scores(max_len))
+
+    # 不属于该查询的文档得分置为 -inf, 排序后位于末尾
+    scores = scores[:, :n_docs]
+    scores[np.arange(n_docs) >= doc_counts[:, np.newaxis]] = -np.inf
+    top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+    top_scores = np.take_along_axis(scores, top, axis=1).tolist()
+    top = top.tolist()
+    return [
+        [[score, texts[i]] for score, i in zip(top_scores[query][:len(texts)], top[query][:len(texts)])]
+        for query, (texts, _) in enumerate(interned)
+    ]
 
 
 def rrf_rerank(
-    vector_query_result: list[int, str],
-    full_text_query_result: list[int, str],
+    vector_query_result: list[str],
+    full_text_query_result: list[str],
     k: int,
     rank_value: int,
+    as_iterator: bool = False,
 ):
     """
     使用 Reciprocal Rank Fusion (RRF) 对两个检索模型的结果进行融合，并返回前 top_n 个文档。
 
-    :param vector_query_result: 向量检索模型的排名列表 [(score, text), ...]
-    :param full_text_query_result: 全文检索的排名列表 [(score, text), ...]
+    :param vector_query_result: 向量检索模型按排名排列的文档列表 [text, ...]
+    :param full_text_query_result: 全文检索按排名排列的文档列表 [text, ...]
     :param rank_value: RRF 中的常数 k
     :param k: 返回前 k 个文档
-    :return: 按 RRF 得分排序后的文档列表 [(rrf_score, text), ...]
+    :param as_iterator: 为 True 时返回迭代器而不是列表, 需要 len() 或下标访问时请用 list(...) 转换
+    :return: 按 RRF 得分排序后的文档列表 [[rrf_score, text], ...]
     """
 
-    # 创建一个字典，用于存储每个文档的 RRF 得分
-    rrf_scores = {}
-
-    # 对第一个模型的排名结果计算 RRF 得分
-    for score, text in enumerate(vector_query_result, start=1):
-        rrf_score = 1 / (rank_value + score)
-        if text in rrf_scores:
-            rrf_scores[text] += rrf_score
-        else:
-            rrf_scores[text] = rrf_score
-
-    # 对第二个模型的排名结果计算 RRF 得分
-    for score, text in enumerate(full_text_query_result, start=1):
-        rrf_score = 1 / (rank_value + score)
-        if text in rrf_scores:
-            rrf_scores[text] += rrf_score
-        else:
-            rrf_scores[text] = rrf_score
+    if len(vector_query_result) + len(full_text_query_result) < _SMALL_RERANK_SIZE:
+        return _top_k_small(_rrf_scores_small(vector_query_result, full_text_query_result, rank_value), k, as_iterator)
 
-    # 根据 RRF 得分对文档进行排序，得分从高到低
-    sorted_results = sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)
+    # 将文档映射为连续的 id, 在稠密数组上累加两个模型的 RRF 得分
+    texts, (vector_ids, full_text_ids) = _intern_texts(vector_query_result, full_text_query_result)
+    rrf_scores = _rrf_scores(vector_ids, full_text_ids, len(texts), rank_value)
 
-    # 返回前 top_k 个文档，并以 [score, text] 格式返回
-    return [[score, text] for text, score in sorted_results[:k]]
+    # 根据 RRF 得分取前 k 个文档，得分从高到低，并以 [score, text] 格式返回
+    return _top_k(rrf_scores, texts, k, as_iterator)
 
 
 def weighted_rank(
-    vector_query_result: list[int, str],
-    full_text_query_result: list[int, str],
+    vector_query_result: list[str],
+    full_text_query_result: list[str],
     k: int,
-    weights: list[float]
+    weights: list[float],
+    as_iterator: bool = False,
 ):
     """
     使用加权得分对向量检索结果和全文检索结果进行重排序。
 
-    :param vector_query_result: 向量检索模型的排名结果 [(score, text), ...]
-    :param full_text_query_result: 全文检索模型的排名结果 [(score, text), ...]
+    :param vector_query_result: 向量检索模型按排名排列的文档列表 [text, ...]
+    :param full_text_query_result: 全文检索模型按排名排列的文档列表 [text, ...]
     :param weights: 对应每个检索模型的权重 [0,1]之间
     :param k: 返回前 k 个文档
+    :param as_iterator: 为 True 时返回迭代器而不是列表, 需要 len() 或下标访问时请用 list(...) 转换
     :return: 按加权得分排序后的文档列表 [[score, text], ...]
     """
 
-    # 合并两个检索模型的结果
-    all_results = []
-    # 向量检索结果
-    all_results.extend([(score, text, "vector") for score, text in enumerate(vector_query_result, start=1)])
-    # 全文检索结果
-    all_results.extend([(score, text, "full_text") for score, text in enumerate(full_text_query_result, start=1)])
+    if len(vector_query_result) + len(full_text_query_result) < _SMALL_RERANK_SIZE:
+        return _top_k_small(_weighted_scores_small(vector_query_result, full_text_query_result, weights), k, as_iterator)
 
-    # 计算加权得分
-    doc_score_map = {}
-    for score, text, model_type in all_results:
-        weight = weights[0] if model_type == "vector" else weights[1]  # 确定权重 weight0 表示向量检索的权重，weight1 表示全文检索的权重
-        norm_score = convert_metric_score(score, model_type)  # 对得分进行归一化
-        weighted_score = norm_score * weight  # 加权
-        if text in doc_score_map:
-            doc_score_map[text] += weighted_score  # 累加得分
-        else:
-            doc_score_map[text] = weighted_score
+    # 将文档映射为连续的 id, 在稠密数组上累加每个文档的加权得分
+    texts, (vector_ids, full_text_ids) = _intern_texts(vector_query_result, full_text_query_result)
+    doc_scores = _weighted_scores(vector_ids, full_text_ids, len(texts), weights)
 
-    # 根据加权得分进行排序，得分从高到低
-    sorted_results = sorted(doc_score_map.items(), key=lambda x: x[1], reverse=True)
+    # 根据加权得分取前 k 个文档，得分从高到低
+    return _top_k(doc_scores, texts, k, as_iterator)
 
-    # 返回前 k 个文档
-    return [[score, text] for text, score in sorted_results[:k]]
+
+def _rrf_scores_small(
+    vector_query_result: list[str],
+    full_text_query_result: list[str],
+    rank_value: int,
+) -> dict[str, float]:
+    """在 dict 上累加较短结果列表的 RRF 得分, 按文档首次出现的顺序排列。"""
+    doc_scores = {}
+    for query_result in (vector_query_result, full_text_query_result):
+        for rank, text in enumerate(query_result, start=1):
+            doc_scores[text] = doc_scores.get(text, 0.0) + 1.0 / (rank_value + rank)
+    return doc_scores
+
+
+def _weighted_scores_small(
+    vector_query_result: list[str],
+    full_text_query_result: list[str],
+    weights: list[float],
+) -> dict[str, float]:
+    """在 dict 上累加较短结果列表的加权得分, 按文档首次出现的顺序排列。"""
+    doc_scores = {}
+    for query_result, weight in zip((vector_query_result, full_text_query_result), weights):
+        for rank, text in enumerate(query_result, start=1):
+            doc_scores[text] = doc_scores.get(text, 0.0) + (_INV_PI * math.atan(-rank) + 0.5) * weight
+    return doc_scores
+
+
+def _top_k_small(doc_scores: dict[str, float], k: int, as_iterator: bool = False):
+    """_top_k 的 dict 版本, 排序规则和返回格式与 _top_k 相同。"""
+    # sorted 是稳定的, 得分相同时保持文档首次出现的顺序
+    top = sorted(doc_scores.items(), key=operator.itemgetter(1), reverse=True)[:k]
+    results = [[score, text] for text, score in top]
+    return iter(results) if as_iterator else results
+
+
+def _intern_texts(*query_results):
+    """
+    将各检索结果中的文档按首次出现的顺序映射为连续的整数 id。
+
+    :param query_results: 多个按排名排列的文档列表
+    :return: (texts, id_arrays), texts[id] 为对应的文档, id_arrays 与 query_results 一一对应
+    """
+    text_to_id = {}
+    id_arrays = [
+        np.fromiter(
+            (text_to_id.setdefault(text, len(text_to_id)) for text in query_result),
+            dtype=np.int64,
+            count=len(query_result),
+        )
+        for query_result in query_results
+    ]
+    return list(text_to_id), id_arrays
+
+
+def _rrf_scores(
+    vector_ids: np.ndarray,
+    full_text_ids: np.ndarray,
+    n_docs: int,
+    rank_value: int,
+) -> np.ndarray:
+    """
+    计算每个文档 id 的 RRF 得分: 1 / (rank_value + rank) 在两路结果上的累加。
+
+    :return: 长度为 n_docs 的得分数组, 下标为文档 id
+    """
+    scores = np.zeros(n_docs, dtype=np.float64)
+    _rrf_accumulate(scores, vector_ids, rank_value)
+    _rrf_accumulate(scores, full_text_ids, rank_value)
+    return scores
+
+
+def _weighted_scores(
+    vector_ids: np.ndarray,
+    full_text_ids: np.ndarray,
+    n_docs: int,
+    weights: list[float],
+) -> np.ndarray:
+    """
+    计算每个文档 id 归一化后的加权得分, weights[0] 表示向量检索的权重，weights[1] 表示全文检索的权重。
+
+    :return: 长度为 n_docs 的得分数组, 下标为文档 id
+    """
+    scores = np.zeros(n_docs, dtype=np.float64)
+    _weighted_accumulate(scores, vector_ids, weights[0])
+    _weighted_accumulate(scores, full_text_ids, weights[1])
+    return scores
+
+
+def _rrf_rank_scores(n: int, rank_value: float) -> np.ndarray:
+    """排名 1..n 的 RRF 得分: 1 / (rank_value + rank)。"""
+    return 1.0 / (rank_value + np.arange(1, n + 1, dtype=np.float64))
+
+
+def _weighted_rank_scores(n: int, weight: float) -> np.ndarray:
+    """排名 1..n 的归一化加权得分。"""
+    return convert_metric_score_batch(np.arange(1, n + 1), "l2") * weight
+
+
+@functools.lru_cache(maxsize=None)
+def _numba_rrf_accumulate():
+    """
+    首次需要时才导入 numba 编译的 RRF 累加循环, 避免导入 mo_vector.client 时就加载 numba。
+
+    :return: 编译的 rrf_accumulate, 未安装 numba 时返回 None
+    """
+    try:
+        from mo_vector.client._rerank_kernels import rrf_accumulate
+    except ImportError:  # numba is an optional dependency
+        return None
+    return rrf_accumulate
+
+
+def _rrf_accumulate(scores: np.ndarray, ids: np.ndarray, rank_value: float) -> None:
+    """将排名为 1..n 的文档 ids 的 RRF 得分累加到 scores 中。"""
+    kernel = _numba_rrf_accumulate() if ids.size >= _NUMBA_MIN_SIZE else None
+    if kernel is not None:
+        # 统一转为 float, 只编译一种参数类型的版本
+        kernel(scores, ids, float(rank_value))
+    else:
+        np.add.at(scores, ids, _rrf_rank_scores(ids.size, rank_value))
+
+
+def _weighted_accumulate(scores: np.ndarray, ids: np.ndarray, weight: float) -> None:
+    """
+    将排名为 1..n 的文档 ids 的归一化加权得分累加到 scores 中。
+    np.arctan 是向量化的, 在编译开销可以摊回的规模下比逐个调用 atan 的编译循环更快, 所以这里不使用 numba。
+    """
+    np.add.at(scores, ids, _weighted_rank_scores(ids.size, weight))
+
+
+def _top_k(scores: np.ndarray, texts: list, k: int, as_iterator: bool = False):
+    """
+    按得分从高到低返回前 k 个文档 [[score, text], ...], 得分相同时保持文档首次出现的顺序。
+    as_iterator 为 True 时返回逐个生成 [score, text] 的迭代器。
+    """
+    candidates = np.arange(scores.size)
+    if 0 < k < scores.size:
+        # 用 argpartition 在 O(n) 内找到第 k 大的得分, 只对不低于它的候选排序
+        kth_score = scores[np.argpartition(scores, -k)[-k]]
+        candidates = np.flatnonzero(scores >= kth_score)
+    top = candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+    results = ([score, texts[i]] for score, i in zip(scores[top].tolist(), top.tolist()))
+    return results if as_iterator else list(results)
 
 
 def convert_metric_score(
@@ -237,6 +478,26 @@ def convert_metric_score(
     return arctan_normalize(score_for_arctan)
 
 
+def convert_metric_score_batch(
+    original_scores: np.ndarray,
+    metric_type: str
+) -> np.ndarray:
+    """
+    convert_metric_score 的批量版本, 对整个得分数组一次性做预处理和归一化。
+    :param original_scores: 原始得分数组
+    :param metric_type: 度量类型 "l2", "ip", "cosine" 等
+    :return: 归一化后的得分数组
+    """
+
+    # 与 convert_metric_score 保持一致, 待2.1.0 发布之后，支持ip 和cosine 距离，去掉这行代码。
+    metric_type = "l2"
+
+    # 距离越小越相似，所以 l2 取 -distance, 其它度量直接使用
+    sign = -1.0 if metric_type.lower() in ["l2", "euclidean"] else 1.0
+
+    return arctan_normalize_batch(sign * np.asarray(original_scores, dtype=np.float64))
+
+
 def arctan_normalize(score: float) -> float:
     """
     将任意实数score映射到(0,1)之间。
@@ -244,5 +505,12 @@ def arctan_normalize(score: float) -> float:
     当 score -> +∞ 时, 归一化结果 -> 1
     当 score -> -∞ 时, 归一化结果 -> 0
     """
-    return (1.0 / math.pi) * math.atan(score) + 0.5
+    return _INV_PI * math.atan(score) + 0.5
+
+
+def arctan_normalize_batch(scores: np.ndarray) -> np.ndarray:
+    """
+    arctan_normalize 的批量版本, 将数组中的每个实数映射到(0,1)之间。
+    """
+    return _INV_PI * np.arctan(scores) + 0.5
 
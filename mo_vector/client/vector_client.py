@@ -1,12 +1,26 @@
+import collections
+import concurrent.futures
 import contextlib
 import copy
 from dataclasses import dataclass
+import json
 import logging
 import enum
+import functools
+import re
+import threading
+import time
 import uuid
 from typing import Type, Tuple, Any, Dict, Generator, Iterable, List, Optional
 
+import numpy as np
 import sqlalchemy
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional dependency
+    orjson = None
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import Session, declarative_base
 
 from mo_vector.sqlalchemy import VectorType, VectorAdaptor
@@ -18,6 +32,175 @@ from mo_vector.client.utils import (
 
 logger = logging.getLogger()
 
+# The number of compiled filter clauses cached per client
+_FILTER_CLAUSE_CACHE_SIZE = 256
+
+# The number of query vectors UNION ALLed into one statement by batch_query
+_BATCH_QUERY_GROUP_SIZE = 64
+
+# Embedding column definitions looked up from the database, keyed on (connection_string, table_name),
+# valued (expire_time, (dimension, distance)), reused by clients created shortly after on the same table
+_COLUMN_DEFINITION_CACHE: Dict[Tuple[str, str], Tuple[float, Tuple[Optional[int], Optional[str]]]] = {}
+_COLUMN_DEFINITION_CACHE_TTL = 60.0
+
+
+# Characters that would change the meaning of a boolean mode full-text search keyword
+_INVALID_KEYWORD_RE = re.compile(r"['\"()]")
+
+
+def _dumps_meta(metadata: Any) -> str:
+    """
+    Serialize the metadata to a JSON string, with orjson when it is installed.
+
+    Falls back to the standard json module for the values orjson rejects, e.g. integers over 64 bits,
+    so that installing orjson doesn't change which metadata is accepted.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(metadata, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            pass
+    return json.dumps(metadata)
+
+
+def _canonical_filter(filters: Dict[str, Any]) -> Any:
+    """
+    Serializes the filters canonically, with sorted keys, so that equal filters give equal keys.
+
+    Raises TypeError if the filter values are not JSON serializable.
+    """
+    if orjson is not None:
+        return orjson.dumps(filters, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(filters, sort_keys=True)
+
+
+class _QueryCache:
+    """
+    LRU cache of vector search results, keyed on the search parameters and the query vector.
+
+    With a positive `threshold`, a query vector also hits the nearest cached query vector with the same search
+    parameters within that L2 distance. The hit returns the cached results as they are, so their distances are
+    those to the cached query vector, not to the new one. For this lookup the cached query vectors are kept in a
+    preallocated matrix, updated as entries are added and evicted, instead of being stacked on every miss.
+    """
+
+    def __init__(self, size: int, threshold: float = 0.0) -> None:
+        self.size = size
+        self.threshold = threshold
+        # Incremented by clear(), a search only caches its results if no clear happened since it started
+        self.generation = 0
+        # key -> (slot of the query vector in the matrix or None, results)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Allocated on the first cached query vector, whose shape fixes the shape of the matrix
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_sq_norms = np.zeros(max(size, 0), dtype=np.float64)
+        self._slot_hashes = np.zeros(max(size, 0), dtype=np.int64)
+        self._slot_used = np.zeros(max(size, 0), dtype=bool)
+        self._slot_keys: List[Optional[tuple]] = [None] * max(size, 0)
+        # Free slots are taken lowest first, so the slots in use are all below the number of slots ever taken
+        self._free_slots = list(range(size - 1, -1, -1))
+        self._slots_taken = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __deepcopy__(self, memo):
+        # The lock can't be copied, and the copy starts with an empty cache of the same configuration
+        return self.__class__(self.size, self.threshold)
+
+    def get(self, query_array: np.ndarray, params: tuple) -> Optional[tuple]:
+        """
+        Look up the cached results of the query vector, or of the nearest cached query vector
+        with the same search parameters within `threshold`.
+        """
+        with self._lock:
+            key = (params, query_array.tobytes())
+            entry = self._entries.get(key)
+            if entry is None and self.threshold > 0:
+                key = self._nearest_key(query_array, params)
+                entry = None if key is None else self._entries[key]
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, query_array: np.ndarray, params: tuple, results: List, generation: int) -> None:
+        """
+        Cache the results of the query vector, evicting the least recently used entries when full.
+
+        The results are dropped if the cache was cleared since `generation` was read, i.e. since the search
+        started, as a write may have committed after the search read the table.
+        """
+        with self._lock:
+            if generation != self.generation or self.size <= 0:
+                return
+            key = (params, query_array.tobytes())
+            entry = self._entries.get(key)
+            if entry is None:
+                while len(self._entries) >= self.size:
+                    _, (evicted_slot, _) = self._entries.popitem(last=False)
+                    self._release_slot(evicted_slot)
+                slot = self._store_vector(key, query_array)
+            else:
+                slot = entry[0]
+            self._entries[key] = (slot, tuple(results))
+            self._entries.move_to_end(key)
+
+    def clear(self) -> None:
+        """Clear the cached results, and keep the results of the searches in flight out of the cache."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._slot_used[:] = False
+            self._slot_keys = [None] * len(self._slot_keys)
+            self._free_slots = list(range(self.size - 1, -1, -1))
+            self._slots_taken = 0
+
+    def _nearest_key(self, query_array: np.ndarray, params: tuple) -> Optional[tuple]:
+        """The key of the nearest cached query vector with the same parameters within `threshold`, or None."""
+        if self._vectors is None or query_array.shape != self._vectors.shape[1:]:
+            return None
+        n = self._slots_taken
+        matches = self._slot_used[:n] & (self._slot_hashes[:n] == hash(params))
+        if not matches.any():
+            return None
+        # |v - q|^2 = |v|^2 - 2 v.q + |q|^2, a single matrix-vector product over the taken slots
+        # rather than copying out the matching rows, the |q|^2 term doesn't change which slot is nearest
+        sq_distances = self._slot_sq_norms[:n] - 2.0 * (self._vectors[:n] @ query_array)
+        sq_distances[~matches] = np.inf
+        slot = int(np.argmin(sq_distances))
+        key = self._slot_keys[slot]
+        # The parameters are matched on their hashes above, check them for a hash collision,
+        # and compute the distance to the nearest slot exactly
+        if key[0] != params or np.linalg.norm(self._vectors[slot] - query_array) > self.threshold:
+            return None
+        return key
+
+    def _store_vector(self, key: tuple, query_array: np.ndarray) -> Optional[int]:
+        """Store the query vector in a free slot of the matrix, returns the slot or None if not stored."""
+        if self.threshold <= 0 or query_array.ndim != 1:
+            return None
+        if self._vectors is None:
+            self._vectors = np.zeros((self.size, query_array.size), dtype=np.float64)
+        elif query_array.shape != self._vectors.shape[1:]:
+            # Only the exact lookup applies to query vectors of another dimension
+            return None
+        slot = self._free_slots.pop()
+        self._slots_taken = max(self._slots_taken, slot + 1)
+        self._vectors[slot] = query_array
+        self._slot_sq_norms[slot] = query_array @ query_array
+        self._slot_hashes[slot] = hash(key[0])
+        self._slot_used[slot] = True
+        self._slot_keys[slot] = key
+        return slot
+
+    def _release_slot(self, slot: Optional[int]) -> None:
+        if slot is not None:
+            self._slot_used[slot] = False
+            self._slot_keys[slot] = None
+            self._free_slots.append(slot)
+
 
 class DistanceStrategy(str, enum.Enum):
     """Enumerator of the Distance strategies."""
@@ -27,12 +210,18 @@ class DistanceStrategy(str, enum.Enum):
     # INNER_PRODUCT = "inner_product"
 
 
+@functools.lru_cache(maxsize=128)
 def _create_vector_table_model(
     table_name: str,
     dim: Optional[int] = None,
     distance: Optional[DistanceStrategy] = None,
 ) -> Tuple[Type[declarative_base], Type]:
-    """Create a vector model class."""
+    """
+    Create a vector model class.
+
+    The model is cached, clients of the same table share it instead of configuring a new mapper each time.
+    Each model has its own declarative base and so its own MetaData.
+    """
 
     OrmBase = declarative_base()  # type: Any
 
@@ -89,6 +278,9 @@ class MoVectorClient:
         *,
         engine_args: Optional[Dict[str, Any]] = None,
         drop_existing_table: bool = False,
+        skip_compat_check: bool = False,
+        query_cache_size: int = 0,
+        query_cache_threshold: float = 0.0,
         **kwargs: Any,
     ) -> None:
         """
@@ -104,6 +296,14 @@ class MoVectorClient:
                 defaults to None.
             drop_existing_table: Delete the table before creating a new one,
                 defaults to False.
+            skip_compat_check (bool): Trust the given `vector_dimension` and `distance_strategy` and skip
+                checking them against the existing table, which saves a database round trip, defaults to False.
+            query_cache_size (int): The number of vector search results to cache in process,
+                defaults to 0, which disables the cache. The cache is shared by the vector searches of `query`,
+                `batch_query` and `mix_query`, and it is cleared on every write through this client.
+            query_cache_threshold (float): Reuse the cached results of a query vector within this L2 distance
+                of the new query vector, defaults to 0.0, which only reuses the results of identical query vectors.
+                The reused results keep their distances to the cached query vector.
             **kwargs (Any): Additional keyword arguments.
 
         """
@@ -115,27 +315,72 @@ class MoVectorClient:
         self._table_name = table_name
         self._engine_args = engine_args or {}
         self._drop_existing_table = drop_existing_table
+        self._skip_compat_check = skip_compat_check
+        self._query_cache_size = query_cache_size
+        self._query_cache_threshold = query_cache_threshold
+        self._query_cache = _QueryCache(query_cache_size, query_cache_threshold)
+        self._filter_clause_cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()  # guards the filter clause cache
         self._bind = self._create_engine()
         self._check_table_compatibility()  # check if the embedding is compatible
         self._orm_base, self._table_model = _create_vector_table_model(
-            table_name, vector_dimension, distance_strategy
+            table_name, self._vector_dimension, self._distance_strategy
         )
-        _ = self.distance_strategy  # check if distance strategy is valid
+        # check if distance strategy is valid, and resolve the distance function once for the searches
+        self._distance_fn = self.distance_strategy
         self._create_table_if_not_exists()
 
+    def __copy__(self):
+        # The copy shares all state with the original, including the engine, the table model and the caches,
+        # the query cache stays consistent since writes through either client clear the same cache
+        cls = self.__class__
+        result = cls.__new__(cls)
+        result.__dict__.update(self.__dict__)
+        return result
+
+    def clone(self, new_connection: Optional[str] = None) -> "MoVectorClient":
+        """
+        Creates a client on the same table with its own engine, unlike `copy.copy` which shares the engine.
+
+        `copy.deepcopy` still works, but it walks all attributes of the client and shares the engine anyway,
+        prefer `copy.copy` to share the client state, or this method to get a fresh engine.
+
+        Args:
+            new_connection (Optional[str]): The connection string of the new client,
+                defaults to None, which connects to the same database.
+
+        Returns:
+            MoVectorClient: The new client.
+        """
+        return self.__class__(
+            connection_string=new_connection or self.connection_string,
+            table_name=self._table_name,
+            distance_strategy=self._distance_strategy,
+            vector_dimension=self._vector_dimension,
+            engine_args=self._engine_args,
+            # The table on the same database was already checked by this client
+            skip_compat_check=self._skip_compat_check or new_connection is None,
+            query_cache_size=self._query_cache_size,
+            query_cache_threshold=self._query_cache_threshold,
+        )
+
     def __deepcopy__(self, memo):
         # Create a shallow copy of the object to start with, to copy non-engine attributes
         cls = self.__class__
         result = cls.__new__(cls)
         memo[id(self)] = result
 
-        # Copy all attributes except the engine connection (_bind)
+        # Copy all attributes except the engine connection (_bind), the lock, which can't be copied,
+        # and the compiled filter clauses and distance function, which are rebuilt from the table model
         for k, v in self.__dict__.items():
-            if k != "_bind":  # Skip copying the engine connection
+            if k not in ("_bind", "_cache_lock", "_filter_clause_cache", "_distance_fn"):
                 setattr(result, k, copy.deepcopy(v, memo))
 
         # Directly assign the engine connection without copying
         result._bind = self._bind
+        result._cache_lock = threading.Lock()
+        result._filter_clause_cache = collections.OrderedDict()
+        result._distance_fn = result.distance_strategy
 
         return result
 
@@ -146,12 +391,30 @@ class MoVectorClient:
         if self._drop_existing_table:
             return
 
-        actual_dim, actual_distance_strategy = get_embedding_column_definition(
-            connection_string=self.connection_string,
-            table_name=self._table_name,
-            column_name="embedding",
-            engine_args=self._engine_args,
-        )
+        if (
+            self._skip_compat_check
+            and self._vector_dimension is not None
+            and self._distance_strategy is not None
+        ):
+            return
+
+        cache_key = (self.connection_string, self._table_name)
+        cached = _COLUMN_DEFINITION_CACHE.get(cache_key)
+        if cached is not None and cached[0] > time.monotonic():
+            actual_dim, actual_distance_strategy = cached[1]
+        else:
+            actual_dim, actual_distance_strategy = get_embedding_column_definition(
+                connection_string=self.connection_string,
+                table_name=self._table_name,
+                column_name="embedding",
+                engine=self._bind,
+            )
+            # Only cache existing columns, a missing table is about to be created with the client's configuration
+            if actual_dim is not None or actual_distance_strategy is not None:
+                _COLUMN_DEFINITION_CACHE[cache_key] = (
+                    time.monotonic() + _COLUMN_DEFINITION_CACHE_TTL,
+                    (actual_dim, actual_distance_strategy),
+                )
         if actual_dim is not None:
             # If the vector dimension is not set, set it to the actual dimension
             if self._vector_dimension is None:
@@ -188,17 +451,29 @@ class MoVectorClient:
 
     def drop_table(self) -> None:
         """Drops the table if it exists."""
-        with Session(self._bind) as session, session.begin():
+        with self._clearing_query_cache(), Session(self._bind) as session, session.begin():
             self._orm_base.metadata.drop_all(session.get_bind())
+        _COLUMN_DEFINITION_CACHE.pop((self.connection_string, self._table_name), None)
 
     def _create_engine(self) -> sqlalchemy.engine.Engine:
-        """Create a sqlalchemy engine."""
-        return sqlalchemy.create_engine(url=self.connection_string, **self._engine_args)
+        """
+        Create a sqlalchemy engine.
+
+        The connection pool is bounded and pre-pinged by default, `engine_args` overrides these defaults.
+        The pool sizing defaults only apply to the default queue pool, not to a `poolclass` or `pool` given
+        in `engine_args`, which may not accept them.
+        """
+        engine_args = dict(pool_pre_ping=True, pool_recycle=3600)
+        if "poolclass" not in self._engine_args and "pool" not in self._engine_args:
+            engine_args.update(pool_size=10, max_overflow=20, pool_timeout=30)
+        engine_args.update(self._engine_args)
+        return sqlalchemy.create_engine(url=self.connection_string, **engine_args)
 
     @contextlib.contextmanager
     def _make_session(self) -> Generator[Session, None, None]:
-        """Create a context manager for the session."""
-        yield Session(self._bind)
+        """Create a context manager for the session, the session is closed on exit."""
+        with Session(self._bind) as session:
+            yield session
 
     @property
     def distance_strategy(self) -> Any:
@@ -225,6 +500,8 @@ class MoVectorClient:
         embeddings: Iterable[List[float]],
         metadatas: Optional[List[dict]] = None,
         ids: Optional[List[str]] = None,
+        upsert: bool = False,
+        chunk_size: int = 1000,
         **kwargs: Any,
     ) -> List[str]:
         """
@@ -236,25 +513,61 @@ class MoVectorClient:
                 Defaults to None.
             ids (Optional[List[str]]): The IDs to be assigned to each text,
                 Defaults to None, will be generated if not provided.
+            upsert (bool): Whether to overwrite the rows whose IDs already exist instead of
+                failing on the duplicate key, Defaults to False.
+            chunk_size (int): The number of rows sent to MO per statement, Defaults to 1000.
 
         Returns:
             List[str]: The IDs assigned to the added texts.
         """
-        if ids is None:
-            ids = [str(uuid.uuid4()) for _ in texts]
-        if not metadatas:
-            metadatas = [{} for _ in texts]
+        if chunk_size <= 0:
+            raise ValueError("expected chunk_size to be a positive integer")
+
+        # Materialize the iterables once, a generator would otherwise be exhausted by the id generation
+        texts = list(texts)
+        embeddings = list(embeddings)
+        n = len(texts)
+        ids = [str(uuid.uuid4()) for _ in range(n)] if ids is None else list(ids)
+        metadatas = list(metadatas) if metadatas else None
+        if n == 0:
+            return ids
+
+        if upsert:
+            # One INSERT ... ON DUPLICATE KEY UPDATE, rather than a lookup and a delete before inserting
+            stmt = mysql.insert(self._table_model.__table__).values(
+                meta=sqlalchemy.bindparam("meta_json", type_=sqlalchemy.Text)
+            )
+            stmt = stmt.on_duplicate_key_update(
+                embedding=stmt.inserted.embedding,
+                document=stmt.inserted.document,
+                meta=stmt.inserted.meta,
+                update_time=sqlalchemy.func.now(),
+            )
+        else:
+            stmt = sqlalchemy.insert(self._table_model.__table__).values(
+                meta=sqlalchemy.bindparam("meta_json", type_=sqlalchemy.Text)
+            )
 
-        with Session(self._bind) as session:
-            for id, text, metadata, embedding in zip(ids, texts, metadatas, embeddings):
-                embedded_doc = self._table_model(
-                    id=id,
-                    embedding=embedding,
-                    document=text,
-                    meta=metadata,
-                )
-                session.add(embedded_doc)
-            session.commit()
+        # Honour the json_serializer configured on the engine, like the JSON column type would
+        dumps = getattr(self._bind.dialect, "_json_serializer", None) or _dumps_meta
+
+        # Insert the rows with one executemany per chunk, bypassing the ORM unit of work,
+        # so that only one chunk of row parameters is held in memory at a time
+        with self._clearing_query_cache(), Session(self._bind) as session, session.begin():
+            for start in range(0, n, chunk_size):
+                end = start + chunk_size
+                # Serialize the metadata up front instead of per row in the JSON type's bind processor
+                if metadatas is None:
+                    metas = ["{}"] * (min(end, n) - start)
+                else:
+                    metas = [dumps(metadata) for metadata in metadatas[start:end]]
+                rows = [
+                    {"id": id, "embedding": embedding, "document": text, "meta_json": meta}
+                    for id, text, meta, embedding in zip(
+                        ids[start:end], texts[start:end], metas, embeddings[start:end]
+                    )
+                ]
+                session.execute(stmt, rows)
 
         return ids
 
@@ -272,7 +585,7 @@ class MoVectorClient:
             **kwargs: Additional keyword arguments.
         """
         filter_by = self._build_filter_clause(filter)
-        with Session(self._bind) as session:
+        with self._clearing_query_cache(), Session(self._bind) as session:
             if ids is not None:
                 filter_by = sqlalchemy.and_(self._table_model.id.in_(ids), filter_by)
             stmt = sqlalchemy.delete(self._table_model).filter(filter_by)
@@ -325,7 +638,102 @@ class MoVectorClient:
         dis_upper_bound: Optional[float] = None,
         **kwargs: Any,
     ) -> List[List[QueryResult]]:
-        return [self.query(query, k, filter, dis_lower_bound, dis_upper_bound, **kwargs) for query in query_vectors]
+        """
+        Perform similarity searches for multiple query vectors, batching them into few round trips.
+
+        Args:
+            :param query_vectors: The query vectors.
+            :param k: The number of results to return for each query vector. Defaults to 5.
+            :param filter: meta filter to apply to the search results. Defaults to None.
+            :param dis_lower_bound: distance lower bound to filter the search results. Defaults to None.
+            :param dis_upper_bound: distance upper bound to filter the search results. Defaults to None.
+
+        Returns:
+            A list containing the query results of each query vector, in the order of `query_vectors`.
+        """
+        if not query_vectors:
+            return []
+
+        # Serve the query vectors with cached results from the query cache, and search only the others
+        results = [None] * len(query_vectors)
+        cache_params = self._query_cache_params(k, filter, dis_lower_bound, dis_upper_bound)
+        if cache_params is not None:
+            generation = self._query_cache.generation
+            query_arrays = [np.asarray(query_vector, dtype=np.float64) for query_vector in query_vectors]
+            for qid, query_array in enumerate(query_arrays):
+                cached = self._query_cache.get(query_array, cache_params)
+                if cached is not None:
+                    results[qid] = cached
+
+        missing = [qid for qid, rows in enumerate(results) if rows is None]
+        if missing:
+            searched = self._batch_vector_search_uncached(
+                [query_vectors[qid] for qid in missing], k, filter, dis_lower_bound, dis_upper_bound
+            )
+            for qid, rows in zip(missing, searched):
+                results[qid] = rows
+                if cache_params is not None:
+                    self._query_cache.put(query_arrays[qid], cache_params, rows, generation)
+
+        return [
+            [
+                QueryResult(
+                    document=row.document,
+                    metadata=row.meta,
+                    id=row.id,
+                    distance=row.distance,
+                )
+                for row in rows
+            ]
+            for rows in results
+        ]
+
+    def _batch_vector_search_uncached(
+        self,
+        query_vectors: List[List[float]],
+        k: int = 5,
+        filter: Optional[Dict[str, str]] = None,
+        dis_lower_bound: Optional[float] = None,
+        dis_upper_bound: Optional[float] = None,
+    ) -> List[List]:
+        """
+        vector search from table for multiple query vectors, bypassing the query cache.
+        The query vectors are searched in groups of _BATCH_QUERY_GROUP_SIZE, one round trip per group.
+        """
+
+        results = []
+        with Session(self._bind) as session:
+            filter_by = self._build_filter_clause(filter)
+            for start in range(0, len(query_vectors), _BATCH_QUERY_GROUP_SIZE):
+                group = query_vectors[start:start + _BATCH_QUERY_GROUP_SIZE]
+                # UNION ALL the per vector top-k queries, tagging each row with the index of its query vector
+                subqueries = [
+                    sqlalchemy.select(
+                        self._build_vector_search_stmt(
+                            query_vector,
+                            k,
+                            filter_by,
+                            dis_lower_bound,
+                            dis_upper_bound,
+                            columns=(
+                                sqlalchemy.literal(qid).label("qid"),
+                                self._table_model.id,
+                                self._table_model.meta,
+                                self._table_model.document,
+                            ),
+                        ).subquery()
+                    )
+                    for qid, query_vector in enumerate(group)
+                ]
+                union = sqlalchemy.union_all(*subqueries).subquery()
+                stmt = sqlalchemy.select(union).order_by(union.c.qid, union.c.distance)
+                rows = session.execute(stmt).all()
+
+                group_results = [[] for _ in group]
+                for row in rows:
+                    group_results[row.qid].append(row)
+                results.extend(group_results)
+        return results
 
     def full_text_query(
         self,
@@ -357,8 +765,16 @@ class MoVectorClient:
         dis_upper_bound: Optional[float] = None,
         **kwargs: Any,
     ) -> List[QueryResult]:
-        vector_result = self._vector_search(query_vector, k, filter, dis_lower_bound, dis_upper_bound, **kwargs)
-        full_text_result = self._fulltext_search(key_words, k, filter, **kwargs)
+        # The two searches are independent round trips, run the full-text search in another thread
+        # while the vector search runs in this one, each of them opens its own session
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            full_text_future = executor.submit(
+                self._fulltext_search, key_words, k, filter, documents_only=True, **kwargs
+            )
+            vector_documents = self._vector_search_documents_only(
+                query_vector, k, filter, dis_lower_bound, dis_upper_bound, **kwargs
+            )
+            full_text_documents = full_text_future.result()
 
         # default rerank_option
         if rerank_option is None:
@@ -368,12 +784,7 @@ class MoVectorClient:
                 "rerank_score_threshold": 1,
             }
 
-        return rerank_data(
-            [doc.document for doc in vector_result],
-            [doc[2] for doc in full_text_result],
-            k,
-            rerank_option,
-        )
+        return rerank_data(vector_documents, full_text_documents, k, rerank_option)
 
     def _vector_search(
         self,
@@ -386,25 +797,129 @@ class MoVectorClient:
     ) -> List:
         """vector search from table."""
 
+        cache_params = self._query_cache_params(k, filter, dis_lower_bound, dis_upper_bound)
+        if cache_params is not None:
+            generation = self._query_cache.generation
+            query_array = np.asarray(query_embedding, dtype=np.float64)
+            results = self._query_cache.get(query_array, cache_params)
+            if results is None:
+                results = self._vector_search_uncached(
+                    query_embedding, k, filter, dis_lower_bound, dis_upper_bound, **kwargs
+                )
+                self._query_cache.put(query_array, cache_params, results, generation)
+            return list(results)
+
+        return self._vector_search_uncached(query_embedding, k, filter, dis_lower_bound, dis_upper_bound, **kwargs)
+
+    def _query_cache_params(
+        self,
+        k: int,
+        filter: Optional[Dict[str, str]],
+        dis_lower_bound: Optional[float],
+        dis_upper_bound: Optional[float],
+    ) -> Optional[tuple]:
+        """The search parameters part of the query cache key, or None if the search is not cached."""
+        if self._query_cache_size <= 0:
+            return None
+        try:
+            filter_key = None if filter is None else _canonical_filter(filter)
+        except TypeError:
+            # The filter values are not JSON serializable, skip the cache
+            return None
+        return (k, filter_key, dis_lower_bound, dis_upper_bound)
+
+    def _vector_search_uncached(
+        self,
+        query_embedding: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, str]] = None,
+        dis_lower_bound: Optional[float] = None,
+        dis_upper_bound: Optional[float] = None,
+        **kwargs: Any,
+    ) -> List:
+        """vector search from table, bypassing the query cache."""
+
         with Session(self._bind) as session:
             filter_by = self._build_filter_clause(filter)
-            distance_col = self.distance_strategy(query_embedding).label("distance")
-
-            results = (
-                session.query(
-                    self._table_model.id,
-                    self._table_model.meta,
-                    self._table_model.document,
-                    distance_col,
+            stmt = self._build_vector_search_stmt(
+                query_embedding, k, filter_by, dis_lower_bound, dis_upper_bound
+            )
+            return session.execute(stmt).all()
+
+    def _vector_search_documents_only(
+        self,
+        query_embedding: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, str]] = None,
+        dis_lower_bound: Optional[float] = None,
+        dis_upper_bound: Optional[float] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        """vector search from table, returning only the documents of the results."""
+
+        if self._query_cache_size > 0:
+            # Go through the cached search, so that mix_query shares the query cache with query and batch_query
+            return [
+                row.document
+                for row in self._vector_search(
+                    query_embedding, k, filter, dis_lower_bound, dis_upper_bound, **kwargs
                 )
-                .filter(filter_by)
-                .filter(distance_col >= dis_lower_bound if dis_lower_bound else True)
-                .filter(distance_col <= dis_upper_bound if dis_upper_bound else True)
-                .order_by(sqlalchemy.asc("distance"))
-                .limit(k)
-                .all()
+            ]
+
+        with Session(self._bind) as session:
+            filter_by = self._build_filter_clause(filter)
+            stmt = self._build_vector_search_stmt(
+                query_embedding,
+                k,
+                filter_by,
+                dis_lower_bound,
+                dis_upper_bound,
+                columns=(self._table_model.document,),
             )
-            return results
+            return session.execute(stmt).scalars().all()
+
+    def clear_query_cache(self) -> None:
+        """Clear the cached vector search results."""
+        self._query_cache.clear()
+
+    @contextlib.contextmanager
+    def _clearing_query_cache(self) -> Generator[None, None, None]:
+        """
+        Clear the query cache once the write in the with block is committed.
+
+        Clearing before the write would let a concurrent search cache the rows it read before the commit,
+        and the searches still in flight when the cache is cleared don't cache their results either.
+        """
+        try:
+            yield
+        finally:
+            self.clear_query_cache()
+
+    def _build_vector_search_stmt(
+        self,
+        query_embedding: List[float],
+        k: int,
+        filter_by: Any,
+        dis_lower_bound: Optional[float] = None,
+        dis_upper_bound: Optional[float] = None,
+        columns: Optional[Iterable[Any]] = None,
+    ) -> sqlalchemy.Select:
+        """
+        Build the select statement of the k nearest rows to the query embedding.
+
+        The statement selects `columns`, defaults to id, meta and document, followed by the distance.
+        """
+        if columns is None:
+            columns = (self._table_model.id, self._table_model.meta, self._table_model.document)
+        distance_col = self._distance_fn(query_embedding).label("distance")
+        stmt = sqlalchemy.select(*columns, distance_col).filter(filter_by)
+        # Keep the bounds on the base select, so the ORDER BY distance LIMIT k can still use the vector index,
+        # and only add the bounds that are set
+        if dis_lower_bound is not None:
+            stmt = stmt.filter(distance_col >= dis_lower_bound)
+        if dis_upper_bound is not None:
+            stmt = stmt.filter(distance_col <= dis_upper_bound)
+        return stmt.order_by(sqlalchemy.asc("distance")).limit(k)
 
     def _build_filter_clause(
         self,
@@ -424,6 +939,38 @@ class MoVectorClient:
         if table_model is None:
             table_model = self._table_model
 
+        if filters is None:
+            return sqlalchemy.true()
+
+        # The clause only depends on the filter content, reuse the clause compiled for an equal filter
+        try:
+            key = (_canonical_filter(filters), table_model)
+        except TypeError:
+            # The filter values are not JSON serializable, skip the cache
+            return self._compile_filter_clause(filters, table_model)
+
+        with self._cache_lock:
+            filter_by = self._filter_clause_cache.get(key)
+            if filter_by is not None:
+                self._filter_clause_cache.move_to_end(key)
+                return filter_by
+
+        filter_by = self._compile_filter_clause(filters, table_model)
+        with self._cache_lock:
+            self._filter_clause_cache[key] = filter_by
+            while len(self._filter_clause_cache) > _FILTER_CLAUSE_CACHE_SIZE:
+                self._filter_clause_cache.popitem(last=False)
+        return filter_by
+
+    def _compile_filter_clause(
+        self,
+        filters: Optional[Dict[str, Any]],
+        table_model: Any,
+    ) -> Any:
+        """
+        Compiles the filter clause of the filters, see `_build_filter_clause`.
+        """
+
         filter_by = sqlalchemy.true()
         if filters is not None:
             filter_clauses = []
@@ -431,7 +978,7 @@ class MoVectorClient:
             for key, value in filters.items():
                 if key.lower() == "$and":
                     and_clauses = [
-                        self._build_filter_clause(condition, table_model)
+                        self._compile_filter_clause(condition, table_model)
                         for condition in value
                         if isinstance(condition, dict) and condition is not None
                     ]
@@ -439,7 +986,7 @@ class MoVectorClient:
                     filter_clauses.append(filter_by_metadata)
                 elif key.lower() == "$or":
                     or_clauses = [
-                        self._build_filter_clause(condition, table_model)
+                        self._compile_filter_clause(condition, table_model)
                         for condition in value
                         if isinstance(condition, dict) and condition is not None
                     ]
@@ -536,26 +1083,43 @@ class MoVectorClient:
         keywords: List[str] = None,
         k: int = 5,
         filter: Optional[Dict[str, str]] = None,
+        documents_only: bool = False,
         **kwargs: Any,
     ) -> List:
-        """fulltext search from table."""
-        keywords_string = " ".join([f"+{keyword}" for keyword in keywords])
+        """
+        fulltext search from table.
+
+        Returns (id, meta, document, score) rows, or only the documents when `documents_only` is set.
+        """
+        keywords = keywords or ()
+        for keyword in keywords:
+            if _INVALID_KEYWORD_RE.search(keyword):
+                raise ValueError(f"Got unexpected full text search keyword: {keyword}.")
+
+        keywords_string = " ".join(f"+{keyword}" for keyword in keywords)
+        if not keywords_string:
+            return []
+
+        score_col = sqlalchemy.text("match(document) against(:keywords in boolean mode)").bindparams(
+            keywords=keywords_string
+        )
+        if documents_only:
+            columns = (sqlalchemy.text("document"), score_col)
+        else:
+            columns = (sqlalchemy.text("id"), sqlalchemy.text("meta"), sqlalchemy.text("document"), score_col)
 
         with Session(self._bind) as session:
             filter_by = self._build_filter_clause(filter)
-            results = (
-                session.query(
-                    sqlalchemy.text("id"),
-                    sqlalchemy.text("meta"),
-                    sqlalchemy.text("document"),
-                    sqlalchemy.text(f"match(document) against('{keywords_string}' in boolean mode)"),
-                )
+            stmt = (
+                sqlalchemy.select(*columns)
                 .select_from(self._table_model)
                 .filter(filter_by)
                 .limit(k)
-                .all()
             )
-        return results
+            result = session.execute(stmt)
+            if documents_only:
+                return result.scalars().all()
+            return result.all()
 
     def execute(self, sql: str, params: Optional[dict] = None) -> dict:
         """
@@ -596,7 +1160,8 @@ class MoVectorClient:
             This might return: {'success': False, 'result': None, 'error': '(Error message)'}
         """
         try:
-            with Session(self._bind) as session, session.begin():
+            # the statement may modify the table
+            with self._clearing_query_cache(), Session(self._bind) as session, session.begin():
                 result = session.execute(sqlalchemy.text(sql), params)
                 session.commit()  # Ensure changes are committed for non-SELECT statements.
                 if sql.strip().lower().startswith("select"):
@@ -607,6 +1172,9 @@ class MoVectorClient:
             # Log the error or handle it as needed
             logger.error(f"SQL execution error: {str(e)}")
             return {"success": False, "result": None, "error": str(e)}
+        finally:
+            # The statement may also alter the embedding column of the table
+            _COLUMN_DEFINITION_CACHE.pop((self.connection_string, self._table_name), None)
 
     def create_full_text_index(self):
         with Session(self._bind) as session, session.begin():
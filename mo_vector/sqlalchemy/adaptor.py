@@ -1,3 +1,5 @@
+from typing import Optional
+
 import sqlalchemy
 from .vector_type import VectorType
 
@@ -37,9 +39,31 @@ class VectorAdaptor:
         self,
         column: sqlalchemy.Column,
         skip_existing: bool = False,
+        *,
+        algorithm: str = "ivfflat",
+        lists: int = 1000,
+        m: Optional[int] = None,
+        ef_construction: Optional[int] = None,
+        ef_search: Optional[int] = None,
     ):
+        """
+        Create a vector index on the vector column.
+
+        Args:
+            column (sqlalchemy.Column): The vector column to index.
+            skip_existing (bool): Do nothing if the column is already indexed.
+            algorithm (str): The index algorithm, "ivfflat" or "hnsw".
+            lists (int): The number of lists of an ivfflat index.
+            m (Optional[int]): The max number of neighbors per node of a hnsw index.
+            ef_construction (Optional[int]): The candidate list size used when building a hnsw index.
+            ef_search (Optional[int]): The candidate list size used when searching a hnsw index.
+        """
         self._check_vector_column(column)
 
+        algorithm = algorithm.lower()
+        if algorithm not in ("ivfflat", "hnsw"):
+            raise ValueError(f"unsupported vector index algorithm: {algorithm}")
+
         if column.type.dim is None:
             raise ValueError(
                 "Vector index is only supported for fixed dimension vectors"
@@ -58,10 +82,22 @@ class VectorAdaptor:
                 f"vec_idx_{column.name}"
             )
 
-            query = sqlalchemy.text("SET experimental_ivf_index = 1")
-            conn.execute(query)
-            query = sqlalchemy.text(
-                f'create index {index_name} using ivfflat on {table_name}({column_name}) lists=1000 op_type "vector_l2_ops"'
-            )
+            if algorithm == "hnsw":
+                options = "".join(
+                    f" {name} {int(value)}"
+                    for name, value in (("M", m), ("EF_CONSTRUCTION", ef_construction), ("EF_SEARCH", ef_search))
+                    if value is not None
+                )
+                query = sqlalchemy.text("SET experimental_hnsw_index = 1")
+                conn.execute(query)
+                query = sqlalchemy.text(
+                    f'create index {index_name} using hnsw on {table_name}({column_name}){options} op_type "vector_l2_ops"'
+                )
+            else:
+                query = sqlalchemy.text("SET experimental_ivf_index = 1")
+                conn.execute(query)
+                query = sqlalchemy.text(
+                    f'create index {index_name} using ivfflat on {table_name}({column_name}) lists={int(lists)} op_type "vector_l2_ops"'
+                )
             conn.execute(query)
 
@@ -1,3 +1,4 @@
+import numpy as np
 import sqlalchemy
 import mo_vector
 import mo_vector.utils
@@ -6,20 +7,31 @@ import mo_vector.utils
 class VectorType(sqlalchemy.types.UserDefinedType):
     """
     Represents a vector column type in MO.
+
+    The column is stored as `vecf64` by default, pass `dtype=np.float32` to store it as `vecf32`,
+    which halves the storage and the memory of the vectors read back from the database.
     """
 
     dim: int
+    dtype: np.dtype
 
     cache_ok = True
 
-    def __init__(self, dim):
+    def __init__(self, dim, dtype=np.float64):
         if not isinstance(dim, int):
             raise ValueError("expected dimension to be an integer")
 
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError("expected dtype to be float32 or float64")
+
         super(sqlalchemy.types.UserDefinedType, self).__init__()
         self.dim = dim
+        self.dtype = dtype
 
     def get_col_spec(self, **kw):
+        if self.dtype == np.float32:
+            return f"vecf32({self.dim})"
         return f"vecf64({self.dim})"
 
     def bind_processor(self, dialect):
@@ -34,7 +46,7 @@ class VectorType(sqlalchemy.types.UserDefinedType):
         """Convert the vector data from the database into vector array."""
 
         def process(value):
-            return mo_vector.utils.decode_vector(value)
+            return mo_vector.utils.decode_vector(value, self.dtype)
 
         return process
 
@@ -12,16 +12,25 @@ def encode_vector(value: mo_vector.VectorDataType, dim=None):
     if isinstance(value, np.ndarray):
         if value.ndim != 1:
             raise ValueError("expected ndim to be 1")
-        return f"[{','.join(map(str, value))}]"
+        return f"[{','.join(map(str, value.tolist()))}]"
 
     return str(value)
 
 
-def decode_vector(value: str) -> np.ndarray:
+def decode_vector(value: str, dtype=np.float64) -> np.ndarray:
     if value is None:
         return value
 
     if value == "[]":
-        return np.array([], dtype=np.float64)
-
-    return np.array(value[1:-1].split(","), dtype=np.float64)
+        return np.array([], dtype=dtype)
+
+    # Parse in C, numpy stops at the first malformed element, so check every element was parsed
+    data = value[1:-1]
+    try:
+        result = np.fromstring(data, dtype=dtype, sep=",")
+    except DeprecationWarning:
+        # Raised instead of returning the truncated result when warnings are turned into errors
+        result = None
+    if result is None or result.size != data.count(",") + 1:
+        raise ValueError(f"invalid vector: {value}")
+    return result
@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from mo_vector.client.embed_cache import EmbeddingCache, embedding_cache_key, get_or_compute
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def provider(self, content):
+        self.calls.append(content)
+        return [float(len(content)), 1.0]
+
+    def test_embedding_cache_key(self):
+        self.assertEqual(embedding_cache_key("dog", "model-a"), embedding_cache_key("dog", "model-a"))
+        self.assertNotEqual(embedding_cache_key("dog", "model-a"), embedding_cache_key("dog", "model-b"))
+        self.assertNotEqual(embedding_cache_key("dog", "model-a"), embedding_cache_key("fish", "model-a"))
+
+    def test_get_or_compute_caches(self):
+        cache = EmbeddingCache()
+        first = cache.get_or_compute("dog", self.provider, "model-a")
+        second = cache.get_or_compute("dog", self.provider, "model-a")
+        np.testing.assert_array_equal(first, np.array([3.0, 1.0]))
+        self.assertIs(first, second)
+        self.assertEqual(self.calls, ["dog"])
+
+    def test_get_or_compute_per_model(self):
+        cache = EmbeddingCache()
+        cache.get_or_compute("dog", self.provider, "model-a")
+        cache.get_or_compute("dog", self.provider, "model-b")
+        self.assertEqual(self.calls, ["dog", "dog"])
+
+    def test_get_or_compute_evicts_least_recently_used(self):
+        cache = EmbeddingCache(maxsize=2)
+        cache.get_or_compute("dog", self.provider, "model-a")
+        cache.get_or_compute("fish", self.provider, "model-a")
+        cache.get_or_compute("dog", self.provider, "model-a")
+        cache.get_or_compute("tree", self.provider, "model-a")
+        self.assertEqual(len(cache), 2)
+        cache.get_or_compute("dog", self.provider, "model-a")
+        cache.get_or_compute("fish", self.provider, "model-a")
+        self.assertEqual(self.calls, ["dog", "fish", "tree", "fish"])
+
+    def test_cached_embedding_is_read_only(self):
+        embedding = get_or_compute("dog", self.provider, "model-a", cache=EmbeddingCache())
+        with self.assertRaises(ValueError):
+            embedding[0] = 0.0
+
+    def test_invalid_maxsize(self):
+        with self.assertRaises(ValueError):
+            EmbeddingCache(maxsize=0)
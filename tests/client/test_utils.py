@@ -1,8 +1,34 @@
 import unittest
-from mo_vector.client.utils import rerank_data, rrf_rerank, weighted_rank, convert_metric_score, arctan_normalize
+from unittest import mock
+import numpy as np
+import sqlalchemy
+from mo_vector.client.utils import (
+    check_table_existence,
+    rerank_data,
+    rerank_data_batch,
+    rrf_rerank,
+    weighted_rank,
+    convert_metric_score,
+    convert_metric_score_batch,
+    arctan_normalize,
+    arctan_normalize_batch,
+)
 
 
 class TestUtils(unittest.TestCase):
+    def test_check_table_existence_with_engine(self):
+        engine = sqlalchemy.create_engine("sqlite://")
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text("CREATE TABLE t (id INTEGER)"))
+        self.assertTrue(check_table_existence("sqlite://", "t", engine=engine))
+        self.assertFalse(check_table_existence("sqlite://", "missing", engine=engine))
+        # The given engine is not disposed, the in-memory table is still there
+        self.assertTrue(check_table_existence("sqlite://", "t", engine=engine))
+
+    def test_check_table_existence_with_dict_engine_args(self):
+        engine_args = {"connect_args": {"check_same_thread": False}}
+        self.assertFalse(check_table_existence("sqlite://", "t", engine_args=engine_args))
+
     def test_rerank_data_with_rrf(self):
         vector_data = ['doc1', 'doc2']
         full_text_data = ['doc3', 'doc4']
@@ -27,6 +53,30 @@ class TestUtils(unittest.TestCase):
             [0.059033447060173286, 'doc4']
         ])
 
+    def test_rerank_data_without_rerank_type(self):
+        vector_data = ['doc1', 'doc2']
+        full_text_data = ['doc2', 'doc3']
+        result = rerank_data(vector_data, full_text_data, 2, {'rerank_type': None})
+        self.assertEqual(result, ['doc1', 'doc2'])
+
+    def test_rerank_data_batch(self):
+        vector_batches = [['doc1', 'doc2'], ['doc5'], []]
+        full_text_batches = [['doc3', 'doc1', 'doc4'], [], []]
+        for rerank_option in [
+            {'rerank_type': 'RRF', 'rank_value': 60},
+            {'rerank_type': 'WeightedRank', 'weighted_score': [0.6, 0.4]},
+            {'rerank_type': None},
+        ]:
+            result = rerank_data_batch(vector_batches, full_text_batches, 3, rerank_option)
+            self.assertEqual(result, [
+                rerank_data(vector_data, full_text_data, 3, rerank_option)
+                for vector_data, full_text_data in zip(vector_batches, full_text_batches)
+            ])
+
+    def test_rerank_data_batch_mismatched_batches(self):
+        with self.assertRaises(ValueError):
+            rerank_data_batch([['doc1']], [], 3, {'rerank_type': 'RRF'})
+
     def test_rrf_rerank_with_valid_data(self):
         vector_data = ['doc1', 'doc2']
         full_text_data = ['doc3', 'doc4']
@@ -38,6 +88,25 @@ class TestUtils(unittest.TestCase):
             [1/62, 'doc4']
         ])
 
+    def test_rrf_rerank_as_iterator(self):
+        vector_data = ['doc1', 'doc2']
+        full_text_data = ['doc3', 'doc4']
+        result = rrf_rerank(vector_data, full_text_data, 2, 60, as_iterator=True)
+        self.assertEqual(next(result), [1/61, 'doc1'])
+        self.assertEqual(list(result), [[1/61, 'doc3']])
+
+    def test_rerank_small_and_large_inputs_agree(self):
+        vector_data = [f'doc{i}' for i in range(40)]
+        full_text_data = [f'doc{i}' for i in range(60, 0, -3)]
+        small = (rrf_rerank(vector_data, full_text_data, 10, 60),
+                 weighted_rank(vector_data, full_text_data, 10, [0.6, 0.4]))
+        with mock.patch('mo_vector.client.utils._SMALL_RERANK_SIZE', 0):
+            large = (rrf_rerank(vector_data, full_text_data, 10, 60),
+                     weighted_rank(vector_data, full_text_data, 10, [0.6, 0.4]))
+        for small_result, large_result in zip(small, large):
+            self.assertEqual([text for _, text in small_result], [text for _, text in large_result])
+            np.testing.assert_allclose([score for score, _ in small_result], [score for score, _ in large_result])
+
     def test_weighted_rank_with_valid_data(self):
         vector_data = ['doc1', 'doc2']
         full_text_data = ['doc3', 'doc4']
@@ -60,4 +129,11 @@ class TestUtils(unittest.TestCase):
 
         score = arctan_normalize(-1)
         self.assertEqual(score, 0.25)
-        
\ No newline at end of file
+
+    def test_convert_metric_score_batch_with_l2(self):
+        scores = convert_metric_score_batch(np.array([0.5, 1.0, 2.0]), 'l2')
+        self.assertEqual(scores.tolist(), [convert_metric_score(s, 'l2') for s in [0.5, 1.0, 2.0]])
+
+    def test_arctan_normalize_batch(self):
+        scores = arctan_normalize_batch(np.array([1.0, -1.0]))
+        self.assertEqual(scores.tolist(), [0.75, 0.25])
@@ -0,0 +1,444 @@
+import collections
+import copy
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+from sqlalchemy.dialects import mysql
+
+from mo_vector.client import vector_client
+from mo_vector.client.vector_client import MoVectorClient, _QueryCache, _create_vector_table_model, _dumps_meta
+
+
+def make_client(query_cache_size=2, query_cache_threshold=0.0):
+    """Builds a client without connecting to MO, for the database independent logic."""
+    client = MoVectorClient.__new__(MoVectorClient)
+    client._query_cache_size = query_cache_size
+    client._query_cache_threshold = query_cache_threshold
+    client._query_cache = _QueryCache(query_cache_size, query_cache_threshold)
+    client._filter_clause_cache = collections.OrderedDict()
+    client._cache_lock = threading.Lock()
+    client._bind = mock.Mock(dialect=mock.Mock(_json_serializer=None))
+    client._orm_base, client._table_model = _create_vector_table_model("test_table", 3)
+    client._distance_strategy = None
+    client._distance_fn = client.distance_strategy
+    return client
+
+
+def mock_session():
+    """Patches the Session of vector_client, returns the patcher and the session used in the with block."""
+    patcher = mock.patch.object(vector_client, "Session")
+    session_cls = patcher.start()
+    return patcher, session_cls.return_value.__enter__.return_value
+
+
+def compile_mysql(stmt):
+    return str(stmt.compile(dialect=mysql.dialect()))
+
+
+Row = collections.namedtuple("Row", ["qid", "id", "meta", "document", "distance"])
+
+
+class TestDumpsMeta(unittest.TestCase):
+    def test_dumps_meta(self):
+        self.assertEqual(json.loads(_dumps_meta({"a": [1, "b"]})), {"a": [1, "b"]})
+
+    def test_dumps_meta_non_str_keys(self):
+        self.assertEqual(json.loads(_dumps_meta({1: "a"})), {"1": "a"})
+
+    def test_dumps_meta_big_int(self):
+        self.assertEqual(json.loads(_dumps_meta({"a": 2**70})), {"a": 2**70})
+
+    def test_dumps_meta_without_orjson(self):
+        with mock.patch.object(vector_client, "orjson", None):
+            self.assertEqual(json.loads(_dumps_meta({1: "a", "b": 2**70})), {"1": "a", "b": 2**70})
+
+
+
+class TestTableModel(unittest.TestCase):
+    def test_table_model_is_shared(self):
+        base, model = _create_vector_table_model("shared_table", 3)
+        self.assertIs(_create_vector_table_model("shared_table", 3)[1], model)
+        self.assertIs(make_client()._table_model, _create_vector_table_model("test_table", 3)[1])
+        self.assertIs(model.__table__.metadata, base.metadata)
+
+    def test_table_model_per_configuration(self):
+        _, model = _create_vector_table_model("shared_table", 3)
+        _, other_dim = _create_vector_table_model("shared_table", 4)
+        _, other_table = _create_vector_table_model("other_table", 3)
+        self.assertIsNot(other_dim, model)
+        self.assertIsNot(other_table, model)
+        # Each model has its own MetaData, so models of the same table name don't conflict
+        self.assertIsNot(other_dim.__table__.metadata, model.__table__.metadata)
+        self.assertEqual(other_dim.__table__.c.embedding.type.dim, 4)
+
+
+class TestCopy(unittest.TestCase):
+    def make_client(self):
+        client = make_client()
+        client.connection_string = "mysql+pymysql://root@127.0.0.1:6001/test"
+        client._table_name = "test_table"
+        client._vector_dimension = 3
+        client._engine_args = {"pool_size": 2}
+        client._skip_compat_check = False
+        return client
+
+    def test_copy_shares_state(self):
+        client = self.make_client()
+        copied = copy.copy(client)
+        self.assertIsNot(copied, client)
+        self.assertIs(copied._bind, client._bind)
+        self.assertIs(copied._table_model, client._table_model)
+        self.assertIs(copied._query_cache, client._query_cache)
+        self.assertIs(copied._filter_clause_cache, client._filter_clause_cache)
+        # A write through the copy clears the cache seen by the original
+        client._query_cache.put(np.array([1.0]), (5, None, None, None), ["doc1"], client._query_cache.generation)
+        copied.clear_query_cache()
+        self.assertEqual(len(client._query_cache), 0)
+
+    def test_clone_creates_new_client(self):
+        client = self.make_client()
+        with mock.patch.object(MoVectorClient, "__init__", return_value=None) as init:
+            cloned = client.clone()
+        self.assertIsInstance(cloned, MoVectorClient)
+        self.assertIsNot(cloned, client)
+        init.assert_called_once_with(
+            connection_string=client.connection_string,
+            table_name="test_table",
+            distance_strategy=None,
+            vector_dimension=3,
+            engine_args={"pool_size": 2},
+            skip_compat_check=True,
+            query_cache_size=2,
+            query_cache_threshold=0.0,
+        )
+
+    def test_clone_to_new_connection_checks_table(self):
+        client = self.make_client()
+        with mock.patch.object(MoVectorClient, "__init__", return_value=None) as init:
+            client.clone("mysql+pymysql://root@127.0.0.1:6002/test")
+        self.assertEqual(init.call_args.kwargs["connection_string"], "mysql+pymysql://root@127.0.0.1:6002/test")
+        self.assertFalse(init.call_args.kwargs["skip_compat_check"])
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.params = (5, None, None, None)
+
+    def test_query_cache_params(self):
+        client = make_client()
+        self.assertEqual(client._query_cache_params(5, None, None, None), (5, None, None, None))
+        self.assertEqual(
+            client._query_cache_params(5, {"a": 1, "b": 2}, 0.1, None),
+            client._query_cache_params(5, {"b": 2, "a": 1}, 0.1, None),
+        )
+        self.assertNotEqual(
+            client._query_cache_params(5, {"a": 1}, None, None),
+            client._query_cache_params(5, {"a": "1"}, None, None),
+        )
+
+    def test_query_cache_params_not_serializable(self):
+        client = make_client()
+        self.assertIsNone(client._query_cache_params(5, {"a": object()}, None, None))
+
+    def test_query_cache_params_disabled(self):
+        client = make_client(query_cache_size=0)
+        self.assertIsNone(client._query_cache_params(5, None, None, None))
+
+    def test_cache_hit(self):
+        cache = _QueryCache(2)
+        cache.put(np.array([1.0, 2.0, 3.0]), self.params, ["doc1"], cache.generation)
+        self.assertEqual(list(cache.get(np.array([1.0, 2.0, 3.0]), self.params)), ["doc1"])
+        self.assertIsNone(cache.get(np.array([1.0, 2.0, 3.1]), self.params))
+        self.assertIsNone(cache.get(np.array([1.0, 2.0, 3.0]), (3, None, None, None)))
+
+    def test_cache_evicts_least_recently_used(self):
+        for threshold in (0.0, 0.1):
+            cache = _QueryCache(2, threshold)
+            cache.put(np.array([1.0]), self.params, ["doc1"], cache.generation)
+            cache.put(np.array([2.0]), self.params, ["doc2"], cache.generation)
+            cache.get(np.array([1.0]), self.params)
+            cache.put(np.array([3.0]), self.params, ["doc3"], cache.generation)
+            self.assertEqual(len(cache), 2)
+            self.assertIsNotNone(cache.get(np.array([1.0]), self.params))
+            self.assertIsNone(cache.get(np.array([2.0]), self.params))
+            self.assertIsNotNone(cache.get(np.array([3.0]), self.params))
+
+    def test_cache_threshold(self):
+        cache = _QueryCache(2, 0.5)
+        cache.put(np.array([0.0, 0.0]), self.params, ["doc1"], cache.generation)
+        cache.put(np.array([1.0, 0.0]), self.params, ["doc2"], cache.generation)
+        self.assertEqual(list(cache.get(np.array([0.9, 0.0]), self.params)), ["doc2"])
+        self.assertEqual(list(cache.get(np.array([0.2, 0.0]), self.params)), ["doc1"])
+        self.assertIsNone(cache.get(np.array([0.0, 2.0]), self.params))
+        self.assertIsNone(cache.get(np.array([0.1, 0.0]), (3, None, None, None)))
+
+    def test_cache_threshold_reuses_evicted_slots(self):
+        cache = _QueryCache(2, 0.5)
+        for i in range(5):
+            cache.put(np.array([float(i), 0.0]), self.params, [f"doc{i}"], cache.generation)
+        self.assertIsNone(cache.get(np.array([2.1, 0.0]), self.params))
+        self.assertEqual(list(cache.get(np.array([3.1, 0.0]), self.params)), ["doc3"])
+        self.assertEqual(list(cache.get(np.array([4.1, 0.0]), self.params)), ["doc4"])
+
+    def test_cache_threshold_shape_mismatch(self):
+        cache = _QueryCache(2, 10.0)
+        cache.put(np.array([0.0, 0.0]), self.params, ["doc1"], cache.generation)
+        cache.put(np.array([0.0, 0.0, 0.0]), self.params, ["doc2"], cache.generation)
+        self.assertIsNone(cache.get(np.array([0.0, 0.0, 1.0, 0.0]), self.params))
+        self.assertEqual(list(cache.get(np.array([0.0, 0.0, 0.0]), self.params)), ["doc2"])
+        self.assertEqual(list(cache.get(np.array([0.0, 1.0]), self.params)), ["doc1"])
+
+    def test_clear_query_cache(self):
+        client = make_client(query_cache_threshold=0.5)
+        client._query_cache.put(np.array([1.0]), self.params, ["doc1"], client._query_cache.generation)
+        client.clear_query_cache()
+        self.assertIsNone(client._query_cache.get(np.array([1.0]), self.params))
+
+    def test_cache_skips_results_of_searches_overlapping_a_clear(self):
+        cache = _QueryCache(2)
+        generation = cache.generation
+        cache.clear()
+        cache.put(np.array([1.0]), self.params, ["doc1"], generation)
+        self.assertEqual(len(cache), 0)
+
+    def test_deepcopy_starts_with_empty_cache(self):
+        client = make_client()
+        client._query_cache.put(np.array([1.0]), self.params, ["doc1"], client._query_cache.generation)
+        copied = copy.deepcopy(client)
+        self.assertIsNot(copied._query_cache, client._query_cache)
+        self.assertEqual(len(copied._query_cache), 0)
+        self.assertEqual(copied._query_cache.size, 2)
+
+    def test_insert_clears_cache_after_commit(self):
+        client = make_client()
+        client._query_cache.put(np.array([1.0]), self.params, ["doc1"], client._query_cache.generation)
+        with mock.patch.object(vector_client, "Session") as session_cls:
+            session = session_cls.return_value.__enter__.return_value
+            session.begin.return_value.__exit__.side_effect = lambda *exc_info: self.assertEqual(
+                len(client._query_cache), 1
+            )
+            client.insert(["doc2"], [[1.0, 2.0, 3.0]])
+        session.begin.return_value.__exit__.assert_called_once()
+        self.assertEqual(len(client._query_cache), 0)
+
+
+
+class TestInsert(unittest.TestCase):
+    def setUp(self):
+        patcher, self.session = mock_session()
+        self.addCleanup(patcher.stop)
+
+    def test_upsert(self):
+        client = make_client()
+        client.insert(["doc1"], [[1.0, 2.0, 3.0]], ids=["id1"], upsert=True)
+        stmt, rows = self.session.execute.call_args[0]
+        sql = compile_mysql(stmt)
+        self.assertIn("ON DUPLICATE KEY UPDATE", sql)
+        self.assertIn("embedding = VALUES(embedding)", sql)
+        self.assertIn("meta = VALUES(meta)", sql)
+        self.assertEqual(rows[0]["id"], "id1")
+
+    def test_insert_without_upsert(self):
+        client = make_client()
+        client.insert(["doc1"], [[1.0, 2.0, 3.0]])
+        self.assertNotIn("ON DUPLICATE KEY UPDATE", compile_mysql(self.session.execute.call_args[0][0]))
+
+    def test_insert_in_chunks(self):
+        client = make_client()
+        ids = client.insert([f"doc{i}" for i in range(5)], [[float(i)] * 3 for i in range(5)], chunk_size=2)
+        self.assertEqual(len(ids), 5)
+        chunks = [call[0][1] for call in self.session.execute.call_args_list]
+        self.assertEqual([len(rows) for rows in chunks], [2, 2, 1])
+        self.assertEqual([row["id"] for rows in chunks for row in rows], ids)
+
+    def test_insert_from_generators(self):
+        client = make_client()
+        ids = client.insert(
+            (f"doc{i}" for i in range(3)),
+            ([float(i)] * 3 for i in range(3)),
+            metadatas=({"i": i} for i in range(3)),
+        )
+        self.assertEqual(len(ids), 3)
+        rows = self.session.execute.call_args[0][1]
+        self.assertEqual([row["document"] for row in rows], ["doc0", "doc1", "doc2"])
+        self.assertEqual([json.loads(row["meta_json"]) for row in rows], [{"i": 0}, {"i": 1}, {"i": 2}])
+        self.assertEqual(rows[2]["embedding"], [2.0, 2.0, 2.0])
+
+    def test_insert_empty(self):
+        client = make_client()
+        self.assertEqual(client.insert(iter([]), iter([])), [])
+        self.session.execute.assert_not_called()
+
+class TestFilterClauseCache(unittest.TestCase):
+    def test_filter_clause_cache_hit(self):
+        client = make_client()
+        filter_by = client._build_filter_clause({"a": 1, "b": {"$in": [1, 2]}})
+        self.assertIs(client._build_filter_clause({"a": 1, "b": {"$in": [1, 2]}}), filter_by)
+        # Equal filters share the cached clause regardless of the key order
+        self.assertIs(client._build_filter_clause({"b": {"$in": [1, 2]}, "a": 1}), filter_by)
+        self.assertEqual(len(client._filter_clause_cache), 1)
+        self.assertIn("json_extract", compile_mysql(filter_by))
+
+    def test_filter_clause_cache_miss(self):
+        client = make_client()
+        filter_by = client._build_filter_clause({"a": 1})
+        self.assertIsNot(client._build_filter_clause({"a": "1"}), filter_by)
+        self.assertIsNot(client._build_filter_clause({"a": [1]}), filter_by)
+        self.assertEqual(len(client._filter_clause_cache), 3)
+
+    def test_filter_clause_not_serializable(self):
+        client = make_client()
+        client._build_filter_clause({"a": object()})
+        self.assertEqual(len(client._filter_clause_cache), 0)
+
+    def test_filter_clause_cache_evicts_least_recently_used(self):
+        client = make_client()
+        with mock.patch.object(vector_client, "_FILTER_CLAUSE_CACHE_SIZE", 2):
+            filter_by = client._build_filter_clause({"a": 1})
+            client._build_filter_clause({"a": 2})
+            client._build_filter_clause({"a": 1})
+            client._build_filter_clause({"a": 3})
+        self.assertEqual(len(client._filter_clause_cache), 2)
+        self.assertIs(client._build_filter_clause({"a": 1}), filter_by)
+
+class TestBatchQuery(unittest.TestCase):
+    def setUp(self):
+        patcher, self.session = mock_session()
+        self.addCleanup(patcher.stop)
+
+    def test_batch_query_groups_rows_by_qid(self):
+        client = make_client(query_cache_size=0)
+        self.session.execute.return_value.all.return_value = [
+            Row(0, "a", {}, "doc_a", 0.1),
+            Row(0, "b", {}, "doc_b", 0.2),
+            Row(2, "c", {}, "doc_c", 0.3),
+        ]
+        results = client.batch_query([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0], [7.0, 8.0, 9.0]], k=2)
+        self.assertEqual([[r.id for r in result] for result in results], [["a", "b"], [], ["c"]])
+        self.assertEqual(results[0][1].distance, 0.2)
+
+        self.assertEqual(self.session.execute.call_count, 1)
+        sql = compile_mysql(self.session.execute.call_args[0][0])
+        self.assertEqual(sql.count("UNION ALL"), 2)
+        self.assertEqual(sql.count("l2_distance"), 3)
+        self.assertIn("ORDER BY anon_1.qid, anon_1.distance", sql)
+
+    def test_batch_query_splits_into_groups(self):
+        client = make_client(query_cache_size=0)
+        self.session.execute.return_value.all.side_effect = [
+            [Row(0, "a", {}, "doc_a", 0.1), Row(1, "b", {}, "doc_b", 0.2)],
+            [Row(0, "c", {}, "doc_c", 0.3)],
+        ]
+        with mock.patch.object(vector_client, "_BATCH_QUERY_GROUP_SIZE", 2):
+            results = client.batch_query([[1.0, 2.0, 3.0]] * 3, k=1)
+        self.assertEqual([[r.id for r in result] for result in results], [["a"], ["b"], ["c"]])
+        self.assertEqual(self.session.execute.call_count, 2)
+        self.assertEqual(compile_mysql(self.session.execute.call_args_list[1][0][0]).count("UNION ALL"), 0)
+
+
+class TestFullTextSearch(unittest.TestCase):
+    def setUp(self):
+        patcher, self.session = mock_session()
+        self.addCleanup(patcher.stop)
+
+    def test_keywords_are_bound(self):
+        client = make_client()
+        client._fulltext_search(["hello", "world"], k=3)
+        compiled = self.session.execute.call_args[0][0].compile(dialect=mysql.dialect())
+        self.assertIn("against(%s in boolean mode)", str(compiled))
+        self.assertNotIn("hello", str(compiled))
+        self.assertEqual(compiled.params["keywords"], "+hello +world")
+
+    def test_invalid_keywords_are_rejected(self):
+        client = make_client()
+        for keyword in ["it's", 'say "hi"', "a)", "(b"]:
+            with self.assertRaises(ValueError):
+                client._fulltext_search(["hello", keyword])
+        self.session.execute.assert_not_called()
+
+    def test_empty_keywords_skip_the_search(self):
+        client = make_client()
+        self.assertEqual(client._fulltext_search(None), [])
+        self.assertEqual(client._fulltext_search([]), [])
+        self.session.execute.assert_not_called()
+
+
+class TestTableCompatibilityCheck(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(vector_client._COLUMN_DEFINITION_CACHE, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(vector_client, "get_embedding_column_definition", return_value=(3, "l2"))
+        self.get_definition = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_client(self, **kwargs):
+        client = make_client()
+        client.connection_string = "mysql+pymysql://root@127.0.0.1:6001/test"
+        client._table_name = "test_table"
+        client._drop_existing_table = False
+        client._skip_compat_check = kwargs.get("skip_compat_check", False)
+        client._vector_dimension = kwargs.get("vector_dimension")
+        client._distance_strategy = kwargs.get("distance_strategy")
+        return client
+
+    def test_skip_compat_check(self):
+        client = self.make_client(skip_compat_check=True, vector_dimension=3, distance_strategy="l2")
+        client._check_table_compatibility()
+        self.get_definition.assert_not_called()
+
+    def test_skip_compat_check_needs_dimension_and_distance(self):
+        client = self.make_client(skip_compat_check=True, vector_dimension=3)
+        client._check_table_compatibility()
+        self.get_definition.assert_called_once()
+        self.assertEqual(client._distance_strategy, "l2")
+
+    def test_column_definition_is_reused(self):
+        first = self.make_client()
+        first._check_table_compatibility()
+        second = self.make_client(vector_dimension=4)
+        with self.assertRaises(vector_client.EmbeddingColumnMismatchError):
+            second._check_table_compatibility()
+        self.get_definition.assert_called_once()
+        self.assertEqual(first._vector_dimension, 3)
+
+    def test_column_definition_expires(self):
+        self.make_client()._check_table_compatibility()
+        expired = time.monotonic() + vector_client._COLUMN_DEFINITION_CACHE_TTL + 1
+        with mock.patch.object(vector_client.time, "monotonic", return_value=expired):
+            self.make_client()._check_table_compatibility()
+        self.assertEqual(self.get_definition.call_count, 2)
+
+    def test_execute_evicts_column_definition(self):
+        client = self.make_client()
+        client._check_table_compatibility()
+        with mock.patch.object(vector_client, "Session"):
+            client.execute("ALTER TABLE test_table DROP COLUMN embedding")
+        self.make_client()._check_table_compatibility()
+        self.assertEqual(self.get_definition.call_count, 2)
+
+
+class TestMixQuery(unittest.TestCase):
+    def test_mix_query(self):
+        client = make_client(query_cache_size=0)
+        with mock.patch.object(client, "_fulltext_search", return_value=["doc2", "doc3"]) as fulltext, \
+                mock.patch.object(client, "_vector_search_documents_only", return_value=["doc1", "doc2"]):
+            results = client.mix_query([1.0, 2.0, 3.0], ["hello"], k=2)
+        self.assertEqual([text for _, text in results], ["doc2", "doc1"])
+        self.assertTrue(fulltext.call_args.kwargs["documents_only"])
+
+    def test_mix_query_raises_full_text_search_error(self):
+        client = make_client(query_cache_size=0)
+        caller = threading.get_ident()
+
+        def fail(*args, **kwargs):
+            self.assertNotEqual(threading.get_ident(), caller)
+            raise ValueError("full text search failed")
+
+        with mock.patch.object(client, "_fulltext_search", side_effect=fail), \
+                mock.patch.object(client, "_vector_search_documents_only", return_value=["doc1"]):
+            with self.assertRaisesRegex(ValueError, "full text search failed"):
+                client.mix_query([1.0, 2.0, 3.0], ["hello"])
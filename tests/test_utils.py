@@ -29,3 +29,16 @@ class TestUtils(unittest.TestCase):
 
     def test_decode_vector(self):
         np.testing.assert_array_equal(decode_vector("[1.0,2.0,3.0]"), np.array([1.0, 2.0, 3.0], dtype=np.float64))
+
+    def test_decode_vector_float32(self):
+        vector = decode_vector("[1.0,2.0,3.0]", np.float32)
+        self.assertEqual(vector.dtype, np.float32)
+        np.testing.assert_array_equal(vector, np.array([1.0, 2.0, 3.0], dtype=np.float32))
+
+    def test_decode_vector_invalid(self):
+        with self.assertRaises(ValueError):
+            decode_vector("[1.0,a,3.0]")
+
+    def test_decode_vector_trailing_comma(self):
+        with self.assertRaises(ValueError):
+            decode_vector("[1,2,]")